@@ -1,12 +1,12 @@
+import tempfile
+import time
+from pathlib import Path
 import streamlit as st
 import pandas as pd
+import numpy as np
 import gspread
-from google.oauth2.service_account import Credentials
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import json
-from data.sheets_manager import SheetsManager
+from concurrent.futures import ThreadPoolExecutor
+from data.sheets_manager import PRICE_TEXT_RE, UNFORMATTED_PARAMS, SheetsManager, with_retry
 
 # --- 1. CONFIGURATION / CONSTANTS ---
 ##In Google Sheets add other brand names which are not highlighted##
@@ -15,6 +15,18 @@ ALDI_HOME_BRANDS = [
     "farmdale", "remano", "dairy fine", "logix", "trimat"
 ]
 
+PRICE_COLUMNS = ['Woolworths_Price', 'Coles_Price', 'Aldi_Price']
+# Disk copy of the products sheet, so cold starts and Sheets outages don't block the page
+GROCERY_CACHE_PATH = Path(tempfile.gettempdir()) / 'grocery.parquet'
+GROCERY_CACHE_TTL = 300  # seconds
+
+COLUMN_MAJOR_PARAMS = {'majorDimension': 'COLUMNS', **UNFORMATTED_PARAMS}
+
+GROCERY_COLUMNS = [
+    'Product_Name', 'Brand', 'Category', 'Size',
+    'Woolworths_Price', 'Coles_Price', 'Aldi_Price', 'Last_Updated'
+]
+
 # Page config
 st.set_page_config(
     page_title="🛒 Aussie Grocery Price Tracker",
@@ -56,71 +68,138 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data(ttl=300)
+def drop_grocery_cache():
+    """Delete the on-disk products copy so the next load goes back to Google Sheets"""
+    GROCERY_CACHE_PATH.unlink(missing_ok=True)
+
+@st.cache_resource
+def _cached_sheets_manager(spreadsheet_id):
+    # A resource, not data: the manager is shared by reference instead of being pickled per call
+    # Every write invalidates the disk copy too, so the rerun after a write reads fresh prices
+    return SheetsManager(spreadsheet_id=spreadsheet_id, on_invalidate=drop_grocery_cache)
+
 def get_sheets_manager():
     try:
         # Pull the ID from your [google_sheets] section in Streamlit secrets
         spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        return SheetsManager(spreadsheet_id=spreadsheet_id)
+        return _cached_sheets_manager(spreadsheet_id)
     except Exception as e:
         st.error(f"❌ Failed to initialize: {e}")
         return None
 
-            
-        # Initialize SheetsManager with the spreadsheet ID
-        manager = SheetsManager(spreadsheet_id)
-        return manager
-    except Exception as e:
-        st.error(f"❌ Failed to initialize SheetsManager: {str(e)}")
-        return None
+def parse_prices(series):
+    """Convert a price column to float32; only cells that arrive as text go through the regex"""
+    # Unformatted reads return real numbers, so most cells convert directly
+    prices = pd.to_numeric(series, errors='coerce')
+    text = prices.isna() & (series != '')
+    if text.any():
+        # Text that isn't a single price ("2 for $5") doesn't match and stays NaN
+        numbers = series[text].astype(str).str.extract(PRICE_TEXT_RE, expand=False)
+        prices[text] = pd.to_numeric(numbers.str.replace(',', '', regex=False), errors='coerce')
+    return pd.to_numeric(prices, downcast='float')
+
+def parse_sheet_dates(series):
+    """Convert a date column holding Sheets serial day numbers and/or date strings"""
+    serials = pd.to_numeric(series, errors='coerce')
+    # Numbers outside the datetime range (e.g. 20240105 typed as a number) become NaT rather than raising
+    dates = pd.to_datetime(serials, unit='D', origin='1899-12-30', errors='coerce')
+    # Timestamps written by the app are ISO strings that Sheets keeps as text
+    text = serials.isna() & (series != '')
+    if text.any():
+        dates[text] = pd.to_datetime(series[text], format='ISO8601', errors='coerce', utc=True).dt.tz_localize(None)
+    return dates
+
+def frame_from_columns(columns):
+    """Build a DataFrame from column-major Sheets values, one [header, v1, v2, ...] list per column"""
+    columns = [c for c in columns if c]
+    n_rows = max((len(c) - 1 for c in columns), default=0)
+    # Sheets trims trailing blanks per column, so pad them back to a common length
+    return pd.DataFrame({c[0]: c[1:] + [''] * (n_rows - len(c) + 1) for c in columns})
+
+def fetch_columns(sheet, title):
+    """Fetch a whole worksheet column-major, so each column is built in one piece"""
+    result = with_retry(sheet.values_get, gspread.utils.absolute_range_name(title), params=COLUMN_MAJOR_PARAMS)
+    return frame_from_columns(result.get('values', []))
+
+def fetch_grocery_data(manager):
+    """Fetch grocery price data from Google Sheets"""
+    # Use the manager to get the spreadsheet
+    sheet = manager.get_spreadsheet('AusGrocery_PriceDB')
+    # Handle and header row are cached by the manager, so a warm load is just the batchGet below
+    worksheet = manager.get_worksheet_at(0)
+    headers = manager.get_headers(worksheet.title)
+
+    # Fetch only the columns the app displays, in one values.batchGet request
+    needed = [(i, h) for i, h in enumerate(headers, start=1) if h in GROCERY_COLUMNS]
+    ranges = []
+    for col_idx, _ in needed:
+        letter = gspread.utils.rowcol_to_a1(1, col_idx).rstrip('1')
+        ranges.append(gspread.utils.absolute_range_name(worksheet.title, f"{letter}:{letter}"))
+    result = with_retry(sheet.values_batch_get, ranges, params=COLUMN_MAJOR_PARAMS) if ranges else {}
+    df = frame_from_columns([(vr.get('values') or [[]])[0] for vr in result.get('valueRanges', [])])
+
+    if df.empty:
+        return pd.DataFrame()
+
+    # Clean and convert price columns (single regex pass, float32)
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_prices(df[col])
+    # float32 is enough for shelf prices; min/idxmin(axis=1) downstream work on it unchanged
+
+    # Brand and Category repeat heavily, so store them as categoricals.
+    # Unformatted reads return numeric-looking cells as numbers; cast first so the categories stay sortable text.
+    for col in ('Brand', 'Category'):
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype('category')
+
+    # Free-text columns as Arrow-backed strings (compact, vectorized string kernels)
+    for col in ('Product_Name', 'Size'):
+        if col in df.columns:
+            df[col] = df[col].astype('string[pyarrow]')
+
+    # Convert Last_Updated to datetime
+    if 'Last_Updated' in df.columns:
+        df['Last_Updated'] = parse_sheet_dates(df['Last_Updated'])
+
+    # Lowercased once here so the search box can do plain substring checks
+    if 'Product_Name' in df.columns:
+        df['_Product_lc'] = df['Product_Name'].str.lower()
+
+    return df
+
+def _write_grocery_cache(df):
+    # Best effort: write next to the target and swap in, so readers never see a partial file
+    tmp_path = GROCERY_CACHE_PATH.with_suffix('.tmp')
+    try:
+        df.to_parquet(tmp_path, compression='zstd')
+        tmp_path.replace(GROCERY_CACHE_PATH)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
 
 @st.cache_data(ttl=300)
 def load_grocery_data():
-    """Load grocery price data from Google Sheets"""
+    """Load grocery price data, preferring a fresh on-disk copy over a Google Sheets round-trip"""
+    cache_path = GROCERY_CACHE_PATH
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < GROCERY_CACHE_TTL:
+        return pd.read_parquet(cache_path)
+
     try:
         manager = get_sheets_manager()
         if manager is None:
-            return pd.DataFrame()
-
-        # Use the manager to get the spreadsheet
-        sheet = manager.get_spreadsheet('AusGrocery_PriceDB')
-        worksheet = sheet.sheet1
-
-        # Get all data
-        data = worksheet.get_all_values()
-
-        if len(data) > 1:
-            headers = data[0]
-            rows = data[1:]
-            df = pd.DataFrame(rows, columns=headers)
-
-            # Clean and convert price columns
-            price_columns = ['Woolworths_Price', 'Coles_Price', 'Aldi_Price']
-            for col in price_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(
-                        df[col].astype(str).str.replace('$', '').str.replace(',', ''), 
-                        errors='coerce'
-                    )
-
-            # Convert Last_Updated to datetime
-            if 'Last_Updated' in df.columns:
-                df['Last_Updated'] = pd.to_datetime(df['Last_Updated'], errors='coerce')
-
-            return df
-        else:
-            return pd.DataFrame()
-
+            raise RuntimeError("Google Sheets manager is unavailable")
+        df = fetch_grocery_data(manager)
     except Exception as e:
+        # Stale data beats no data when Sheets is unreachable
+        if cache_path.exists():
+            st.warning(f"⚠️ Showing cached data; Google Sheets is unavailable: {str(e)}")
+            return pd.read_parquet(cache_path)
         st.error(f"❌ Failed to load data: {str(e)}")
         return pd.DataFrame()
-           
-    # Define your "Ignore List"
-    COLUMNS_TO_IGNORE = ['Search_Keyword_Aldi', 'Brand_Type', 'Aldi_URL']
-        
-    # THE VITAL STEP: Actually drop them
-    # 'errors=ignore' ensures the app doesn't crash if a column is missing
-    display_df = df.drop(columns=COLUMNS_TO_IGNORE, errors='ignore')
+
+    if not df.empty:
+        _write_grocery_cache(df)
+    return df
 
 def load_shopping_lists():
     """Load shopping lists from Google Sheets"""
@@ -133,13 +212,10 @@ def load_shopping_lists():
 
         # Try to get shopping lists worksheet
         try:
-            worksheet = sheet.worksheet('User_Shopping_Lists')
-            data = worksheet.get_all_values()
+            worksheet = manager.get_worksheet('User_Shopping_Lists')
+            df = fetch_columns(sheet, worksheet.title)
 
-            if len(data) > 1:
-                headers = data[0]
-                rows = data[1:]
-                df = pd.DataFrame(rows, columns=headers)
+            if not df.empty:
 
                 # Convert quantity to numeric
                 if 'Quantity' in df.columns:
@@ -147,21 +223,19 @@ def load_shopping_lists():
 
                 # Convert date
                 if 'Created_Date' in df.columns:
-                    df['Created_Date'] = pd.to_datetime(df['Created_Date'], errors='coerce')
+                    df['Created_Date'] = parse_sheet_dates(df['Created_Date'])
 
                 return df
             else:
                 return pd.DataFrame()
 
         except gspread.exceptions.WorksheetNotFound:
-            # Create the worksheet if it doesn't exist
-            worksheet = sheet.add_worksheet(
-                title='User_Shopping_Lists',
-                rows=100,
-                cols=4
+            # Create the worksheet (with headers) if it doesn't exist
+            manager.add_worksheet_with_headers(
+                'User_Shopping_Lists',
+                ['List_Name', 'Product_Name', 'Quantity', 'Created_Date'],
+                rows=100
             )
-            # Add headers
-            worksheet.update('A1:D1', [['List_Name', 'Product_Name', 'Quantity', 'Created_Date']])
             return pd.DataFrame()
 
     except Exception as e:
@@ -180,38 +254,30 @@ def load_price_history():
 
         # Try to get price history worksheet
         try:
-            worksheet = sheet.worksheet('Price_History')
-            data = worksheet.get_all_values()
+            worksheet = manager.get_worksheet('Price_History')
+            df = fetch_columns(sheet, worksheet.title)
 
-            if len(data) > 1:
-                headers = data[0]
-                rows = data[1:]
-                df = pd.DataFrame(rows, columns=headers)
+            if not df.empty:
 
                 # Convert price to numeric
                 if 'Price' in df.columns:
-                    df['Price'] = pd.to_numeric(
-                        df['Price'].astype(str).str.replace('$', '').str.replace(',', ''), 
-                        errors='coerce'
-                    )
+                    df['Price'] = parse_prices(df['Price'])
 
                 # Convert date
                 if 'Date' in df.columns:
-                    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+                    df['Date'] = parse_sheet_dates(df['Date'])
 
                 return df
             else:
                 return pd.DataFrame()
 
         except gspread.exceptions.WorksheetNotFound:
-            # Create the worksheet if it doesn't exist
-            worksheet = sheet.add_worksheet(
-                title='Price_History',
-                rows=1000,
-                cols=4
+            # Create the worksheet (with headers) if it doesn't exist
+            manager.add_worksheet_with_headers(
+                'Price_History',
+                ['Product_Name', 'Store', 'Price', 'Date'],
+                rows=1000
             )
-            # Add headers
-            worksheet.update('A1:D1', [['Product_Name', 'Store', 'Price', 'Date']])
             return pd.DataFrame()
 
     except Exception as e:
@@ -219,36 +285,44 @@ def load_price_history():
         return pd.DataFrame()
 
 
-def calculate_savings(row):
-    """Calculate savings and best deals for a product"""
-    prices = {}
-    stores = ['Woolworths', 'Coles', 'Aldi']
-
-    for store in stores:
-        price_col = f"{store}_Price"
-        if price_col in row.index and pd.notna(row[price_col]) and row[price_col] != '':
-            try:
-                price_val = float(row[price_col])
-            except Exception:
-                # If it's a string with $ or commas, attempt cleanup
-                try:
-                    price_val = float(str(row[price_col]).replace('$', '').replace(',', ''))
-                except Exception:
-                    continue
-            if price_val > 0:
-                prices[store] = price_val
-
-    if not prices:
-        return None, 0.0, 0.0
-
-    min_price = min(prices.values())
-    max_price = max(prices.values())
-    best_store = min(prices, key=prices.get)
-
-    savings = max_price - min_price
-    savings_percent = (savings / max_price) * 100 if max_price > 0 else 0
-
-    return best_store, savings, savings_percent
+def test_connection(manager):
+    """Probe the spreadsheet, fetching the worksheet list and product headers concurrently"""
+    sheet = manager.get_spreadsheet('AusGrocery_PriceDB')
+
+    # One request each and neither depends on the other, so they overlap instead of running in turn.
+    # An A1 range without a sheet name reads the first sheet, so the header probe skips the metadata fetch.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        titles_future = executor.submit(with_retry, sheet.worksheets)
+        headers_future = executor.submit(with_retry, sheet.values_get, '1:1')
+        titles = [ws.title for ws in titles_future.result()]
+        headers = (headers_future.result().get('values') or [[]])[0]
+
+    return titles, headers
+
+
+def compute_savings_vec(df):
+    """Vectorized best/worst price and cheapest-store index per product (best_idx is -1 when no valid price)"""
+    price_cols = [c for c in PRICE_COLUMNS if c in df.columns]
+    if not price_cols:
+        empty = np.full(len(df), np.nan)
+        return price_cols, empty, empty, np.full(len(df), -1)
+
+    arr = df[price_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    arr = np.where(arr > 0, arr, np.nan)  # non-positive prices don't count
+    # fmin/fmax skip NaN and return NaN for all-NaN rows without warning
+    mn = np.fmin.reduce(arr, axis=1)
+    mx = np.fmax.reduce(arr, axis=1)
+    best_idx = np.where(np.isnan(mn), -1, np.argmin(np.where(np.isnan(arr), np.inf, arr), axis=1))
+    return price_cols, mn, mx, best_idx
+
+def category_options(df):
+    """Selectbox options for the category filter"""
+    if 'Category' not in df.columns:
+        return ['All']
+    category = df['Category']
+    # load_grocery_data stores Category as a categorical, whose categories are already the unique values
+    values = category.cat.categories if isinstance(category.dtype, pd.CategoricalDtype) else category.dropna().unique()
+    return ['All'] + sorted(values.tolist())
 
 def display_product_comparison(df):
     """Display product comparison with savings analysis"""
@@ -263,19 +337,19 @@ def display_product_comparison(df):
         search_term = st.text_input("🔍 Search products:", placeholder="Enter product name...")
 
     with col2:
-        categories = ['All'] + sorted(df['Category'].dropna().unique().tolist()) if 'Category' in df.columns else ['All']
+        categories = category_options(df)
         selected_category = st.selectbox("🏷️ Filter by category:", categories)
 
-    # Filter data
-    filtered_df = df.copy()
+    # Filter data: combine the conditions into one mask and select once, without copying df first
+    mask = pd.Series(True, index=df.index)
 
     if search_term:
-        filtered_df = filtered_df[
-            filtered_df['Product_Name'].str.contains(search_term, case=False, na=False)
-        ]
+        mask &= df['_Product_lc'].str.contains(search_term.lower(), regex=False, na=False)
 
     if selected_category != 'All':
-        filtered_df = filtered_df[filtered_df['Category'] == selected_category]
+        mask &= df['Category'] == selected_category
+
+    filtered_df = df.loc[mask]
 
     if filtered_df.empty:
         st.warning("No products match your search criteria")
@@ -284,98 +358,37 @@ def display_product_comparison(df):
     # Display products
     st.subheader("🛒 Price Comparison")
 
-    for idx, row in filtered_df.iterrows():
-        product_name = row.get('Product_Name', 'Unnamed Product')
-        with st.expander(f"🏷️ {product_name}", expanded=True):
-            col1, col2, col3, col4 = st.columns(4)
-
-            # Price display
-            stores = [
-                ('Woolworths', 'Woolworths_Price', '#0066CC'),
-                ('Coles', 'Coles_Price', '#FF0000'),
-                ('Aldi', 'Aldi_Price', '#FF6600')
-            ]
-
-            prices = {}
-            for store_name, price_col, color in stores:
-                price = row.get(price_col, None)
-                if pd.notna(price) and price != '':
-                    try:
-                        p = float(price)
-                    except Exception:
-                        try:
-                            p = float(str(price).replace('$', '').replace(',', ''))
-                        except Exception:
-                            p = None
-                    if p is not None and p > 0:
-                        prices[store_name] = p
-
-            if prices:
-                best_store, savings, savings_percent = calculate_savings(row)
-
-                # Display prices
-                for i, (store_name, price_col, color) in enumerate(stores):
-                    target_col = [col1, col2, col3][i]
-                    price = row.get(price_col, None)
-                    if pd.notna(price) and price != '':
-                        try:
-                            price_float = float(price)
-                        except Exception:
-                            try:
-                                price_float = float(str(price).replace('$', '').replace(',', ''))
-                            except Exception:
-                                price_float = None
-                    else:
-                        price_float = None
-
-                    if price_float is not None and price_float > 0:
-                        is_best = (store_name == best_store)
-                        target_col.markdown(f"""
-                        <div style="background-color: {'#e8f5e8' if is_best else '#f8f9fa'}; 
-                                    border: {'3px solid #28a745' if is_best else '1px solid #dee2e6'};
-                                    padding: 1rem; border-radius: 0.5rem; text-align: center;">
-                            <h4 style="color: {color}; margin: 0;">{store_name}</h4>
-                            <h2 style="margin: 0.5rem 0;">${price_float:.2f}</h2>
-                            {'<span style="color: #28a745; font-weight: bold;">✅ BEST DEAL</span>' if is_best else ''}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        target_col.markdown(f"""
-                        <div style="background-color: #f8f9fa; border: 1px solid #dee2e6;
-                                    padding: 1rem; border-radius: 0.5rem; text-align: center;">
-                            <h4 style="color: {color}; margin: 0;">{store_name}</h4>
-                            <h2 style="margin: 0.5rem 0; color: #6c757d;">N/A</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                # Savings information
-                if savings and savings > 0:
-                    col4.markdown(f"""
-                    <div style="background-color: #d4edda; border: 1px solid #c3e6cb;
-                                padding: 1rem; border-radius: 0.5rem; text-align: center;">
-                        <h4 style="color: #155724; margin: 0;">💰 Potential Savings</h4>
-                        <h3 style="margin: 0.5rem 0; color: #28a745;">${savings:.2f}</h3>
-                        <p style="margin: 0; color: #155724;">({savings_percent:.1f}% off)</p>
-                        <small>Choose {best_store} instead</small>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    col4.markdown(f"""
-                    <div style="background-color: #f8f9fa; border: 1px solid #dee2e6;
-                                padding: 1rem; border-radius: 0.5rem; text-align: center;">
-                        <h4 style="color: #6c757d; margin: 0;">📊 Same Price</h4>
-                        <p style="margin: 0;">All stores match</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-            # Additional info
-            cat = row.get('Category', None)
-            if pd.notna(cat) and cat != '':
-                st.caption(f"📂 Category: {cat}")
-
-            lu = row.get('Last_Updated', None)
-            if pd.notna(lu) and lu != '':
-                st.caption(f"🕒 Last updated: {lu}")
+    # Best price/store/savings for every row in one vectorized pass
+    price_cols, best_price, worst_price, best_idx = compute_savings_vec(filtered_df)
+    # Trailing None so best_idx == -1 (no valid price) maps to an empty store
+    store_names = np.array([c.replace('_Price', '') for c in price_cols] + [None], dtype=object)
+    savings = worst_price - best_price
+    table = filtered_df.assign(
+        Best_Store=store_names[best_idx],
+        Best_Price=best_price,
+        Savings=savings,
+        Savings_Pct=np.divide(savings * 100, worst_price, out=np.full_like(savings, np.nan), where=worst_price > 0),
+    )
+
+    display_cols = [c for c in ['Product_Name', 'Category', 'Size'] if c in table.columns]
+    display_cols += price_cols + ['Best_Store', 'Best_Price', 'Savings', 'Savings_Pct']
+    if 'Last_Updated' in table.columns:
+        display_cols.append('Last_Updated')
+
+    money = st.column_config.NumberColumn(format="$%.2f")
+    column_config = {c: money for c in price_cols + ['Best_Price', 'Savings']}
+    column_config['Savings_Pct'] = st.column_config.NumberColumn("Savings %", format="%.1f%%")
+    # Highlight from best_idx, so the green cell always agrees with Best_Store (zero/blank prices never win)
+    best_cell = best_idx[:, None] == np.arange(len(price_cols))
+    highlight = pd.DataFrame(
+        np.where(best_cell, 'background-color: #e8f5e8', ''), index=table.index, columns=price_cols
+    )
+    st.dataframe(
+        table[display_cols].style.apply(lambda _: highlight, axis=None, subset=price_cols),
+        column_config=column_config,
+        hide_index=True,
+        use_container_width=True,
+    )
 
 def main():
     """Main application"""
@@ -387,12 +400,31 @@ def main():
         
         if st.button("🔄 Refresh Data", type="primary"):
             st.cache_data.clear()
+            drop_grocery_cache()
             st.rerun()
         
         if st.button("🧪 Test Connection"):
             manager = get_sheets_manager()
             if manager:
-                st.success("✅ Connected to Google Sheets!")
+                try:
+                    with st.spinner("Checking Google Sheets..."):
+                        titles, headers = test_connection(manager)
+                    st.success(f"✅ Connected to Google Sheets! {len(titles)} worksheets found.")
+                    missing = [c for c in ['Product_Name'] + PRICE_COLUMNS if c not in headers]
+                    if missing:
+                        st.warning(f"⚠️ Missing columns: {', '.join(missing)}")
+                except Exception as e:
+                    st.error(f"❌ Connection test failed: {str(e)}")
+
+        pending = SheetsManager.pending_update_count()
+        if pending and st.button(f"📤 Flush {pending} pending updates"):
+            manager = get_sheets_manager()
+            if manager:
+                try:
+                    sent = manager.flush_price_updates()
+                    st.success(f"✅ Saved {sent} price updates")
+                except Exception as e:
+                    st.error(f"❌ Failed to save price updates: {str(e)}")
 
 
     # Main content
@@ -414,25 +446,18 @@ def main():
                 st.metric("📂 Categories", categories)
 
         with col3:
-            # Calculate average price
-            price_cols = ['Woolworths_Price', 'Coles_Price', 'Aldi_Price']
-            all_prices = []
-            for col in price_cols:
-                if col in df.columns:
-                    prices = pd.to_numeric(df[col], errors='coerce').dropna()
-                    all_prices.extend(prices.tolist())
-
-            if all_prices:
-                avg_price = sum(all_prices) / len(all_prices)
+            # Calculate average price (price columns are already numeric from load_grocery_data)
+            vals = df[[c for c in PRICE_COLUMNS if c in df.columns]].to_numpy(dtype=float).ravel()
+            vals = vals[np.isfinite(vals)]
+
+            if vals.size:
+                avg_price = vals.mean()
                 st.metric("💰 Avg Price", f"${avg_price:.2f}")
 
         with col4:
             # Calculate total potential savings
-            total_savings = 0.0
-            for _, row in df.iterrows():
-                _, savings, _ = calculate_savings(row)
-                if savings:
-                    total_savings += float(savings)
+            _, best_price, worst_price, _ = compute_savings_vec(df)
+            total_savings = float(np.nansum(worst_price - best_price))
 
             st.metric("💸 Total Savings Available", f"${total_savings:.2f}")
 
@@ -456,7 +481,8 @@ def main():
 if __name__ == "__main__":
     main()
 
-# Add this button temporarily to clear cache
-if st.button("🔄 Clear Cache & Reload"):
-    st.cache_data.clear()
-    st.rerun()
+    # Add this button temporarily to clear cache
+    if st.button("🔄 Clear Cache & Reload"):
+        st.cache_data.clear()
+        drop_grocery_cache()
+        st.rerun()
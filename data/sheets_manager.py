@@ -1,7 +1,12 @@
 from __future__ import annotations
+import math
+import random
+import re
+import time
+import zlib
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 import pandas as pd
 import streamlit as st
 import gspread
@@ -13,13 +18,107 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive",
 ]
 
+STORE_PRICE_COLUMNS = {"woolworths": "Woolworths_Price", "coles": "Coles_Price", "aldi": "Aldi_Price"}
+PRICE_NUMBER_FORMAT = {"numberFormat": {"type": "CURRENCY", "pattern": "\"$\"#,##0.00"}}
+# A price given as text: one number, optionally with "$", thousands commas and an "ea" suffix.
+# Anything else ("2 for $5", "1.5kg $3") isn't a single shelf price.
+PRICE_TEXT_RE = re.compile(r"^\s*\$?\s*([\d,]*\.?\d+)\s*(?:ea)?\s*$", re.IGNORECASE)
+
+# Queued price updates are flushed once this many are waiting, or when the last flush is older than this
+FLUSH_MAX_UPDATES = 20
+FLUSH_MAX_AGE_SECONDS = 3.0
+
+# Read cells as raw numbers / serial dates instead of display strings like "$3.50"
+UNFORMATTED_PARAMS = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}
+
+# The only columns the write path reads: row lookup needs Product_Name, skip-unchanged needs the prices
+SNAPSHOT_COLUMNS = ("Product_Name", *STORE_PRICE_COLUMNS.values())
+
+# (spreadsheet_id, worksheet title) pairs whose price columns already carry PRICE_NUMBER_FORMAT
+_price_formatted: Set[Tuple[str, str]] = set()
+
+# Rate limiting plus the transient server errors Google asks clients to retry; only safe for
+# reads and fixed-range writes, since a 5xx can arrive after the request was already applied
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# A 429 means the request was rejected, not applied, so even appends and sheet creation can retry it
+RATE_LIMIT_STATUS = (429,)
+
+T = TypeVar("T")
+
+def parse_price(value: Any) -> Optional[float]:
+    """Reads a price from a number or a string like "$2.99"; None when it isn't a single finite price."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        price = float(value)
+    else:
+        match = PRICE_TEXT_RE.match(str(value))
+        if not match:
+            return None
+        price = float(match.group(1).replace(",", ""))
+    return price if math.isfinite(price) else None
+
+def with_retry(
+    fn: Callable[..., T], *args: Any, retries: int = 6, base: float = 1.0, cap: float = 32.0,
+    retry_on: Tuple[int, ...] = RETRYABLE_STATUS, **kwargs: Any,
+) -> T:
+    """Calls fn, backing off exponentially (with jitter) on the HTTP statuses in retry_on."""
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except APIError as e:
+            status = getattr(e.response, "status_code", None)
+            if status not in retry_on or attempt >= retries:
+                raise
+            # Honour the server's Retry-After hint when present
+            retry_after = e.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = min(cap, float(retry_after))
+            else:
+                delay = min(cap, base * 2 ** attempt) + random.uniform(0, 1)
+            time.sleep(delay)
+            attempt += 1
+
+@st.cache_resource(show_spinner=False)
+def _build_credentials() -> Credentials:
+    """Parses the service-account key once per process; every client and read shares the result."""
+    try:
+        sa_info: Dict[str, Any] = dict(st.secrets["gcp_service_account"])
+        return Credentials.from_service_account_info(sa_info, scopes=SCOPES)
+    except Exception as e:
+        raise RuntimeError(f"Failed to build Google credentials: {e}")
+
+@st.cache_resource(show_spinner=False)
+def _authorized_client() -> gspread.Client:
+    """One authorized client per process, so its HTTP session (and token) is reused across calls."""
+    return gspread.authorize(_build_credentials())
+
+@st.cache_resource(show_spinner=False)
+def _open_spreadsheet(spreadsheet_id: str) -> gspread.Spreadsheet:
+    """Opens a spreadsheet by key once per process; later calls skip the metadata fetch."""
+    return with_retry(_authorized_client().open_by_key, spreadsheet_id)
+
+@st.cache_resource(show_spinner=False)
+def _open_worksheet(spreadsheet_id: str, worksheet_name: str) -> gspread.Worksheet:
+    return with_retry(_open_spreadsheet(spreadsheet_id).worksheet, worksheet_name)
+
+@st.cache_resource(show_spinner=False)
+def _open_worksheet_at(spreadsheet_id: str, index: int) -> gspread.Worksheet:
+    ws = with_retry(_open_spreadsheet(spreadsheet_id).get_worksheet, index)
+    # gspread 5 returns None for a missing index; gspread 6 raises WorksheetNotFound itself
+    if ws is None:
+        raise WorksheetNotFound(f"No worksheet at index {index}")
+    return ws
+
 @dataclass(frozen=True)
 class SheetsConfig:
     spreadsheet_id: str
     worksheet_name: str = "Products_Master"
 
 class SheetsManager:
-    def __init__(self, spreadsheet_id: Optional[str] = None, worksheet_name: str = "Products_Master"):
+    def __init__(
+        self, spreadsheet_id: Optional[str] = None, worksheet_name: str = "Products_Master",
+        on_invalidate: Optional[Callable[[], None]] = None,
+    ):
         # 1. Resolve ID from secrets
         if not spreadsheet_id:
             try:
@@ -34,22 +133,18 @@ class SheetsManager:
             raise ValueError("Missing spreadsheet_id. Set st.secrets['google_sheets']['spreadsheet_id']")
 
         self.config = SheetsConfig(spreadsheet_id=spreadsheet_id, worksheet_name=worksheet_name)
+        # Lets the app drop caches the manager can't see (e.g. an on-disk copy) whenever a write lands
+        self.on_invalidate = on_invalidate
 
     # --- INTERNAL HELPERS ---
     def _get_credentials(self) -> Credentials:
-        try:
-            sa_info: Dict[str, Any] = dict(st.secrets["gcp_service_account"])
-            return Credentials.from_service_account_info(sa_info, scopes=SCOPES)
-        except Exception as e:
-            raise RuntimeError(f"Failed to build Google credentials: {e}")
+        return _build_credentials()
 
     def _get_client(self) -> gspread.Client:
-        return gspread.authorize(self._get_credentials())
+        return _authorized_client()
 
     def _get_worksheet(self) -> gspread.Worksheet:
-        client = self._get_client()
-        sh = client.open_by_key(self.config.spreadsheet_id)
-        return sh.worksheet(self.config.worksheet_name)
+        return _open_worksheet(self.config.spreadsheet_id, self.config.worksheet_name)
 
     @staticmethod
     def _norm(s: str) -> str:
@@ -59,68 +154,311 @@ class SheetsManager:
     def _now_iso_utc() -> str:
         return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
+    def _snapshot_key(self, ws: gspread.Worksheet) -> str:
+        return f"{self.config.spreadsheet_id}:{ws.title}"
+
+    def get_snapshot(self, ws: gspread.Worksheet, ttl: int = 60) -> Tuple[List[str], Dict[int, List[Any]]]:
+        """Returns (headers, columns), reusing this session's snapshot if younger than ttl seconds.
+
+        columns maps a 1-based column to its cells from row 2 down, for SNAPSHOT_COLUMNS only.
+        """
+        key = self._snapshot_key(ws)
+        snapshots = st.session_state.setdefault("sheet_snapshot", {})
+        cached = snapshots.get(key)
+        if cached and time.monotonic() - cached["fetched_at"] < ttl:
+            return cached["headers"], cached["columns"]
+
+        headers, columns = self._fetch_snapshot(ws)
+        snapshots[key] = {"fetched_at": time.monotonic(), "headers": headers, "columns": columns}
+        return headers, columns
+
+    def _fetch_snapshot(self, ws: gspread.Worksheet) -> Tuple[List[str], Dict[int, List[Any]]]:
+        """Reads row 1 plus the SNAPSHOT_COLUMNS in one values.batchGet, not the whole sheet."""
+        wanted = {self._norm(h) for h in SNAPSHOT_COLUMNS}
+        # Column positions come from the cached header row; row 1 rides along to confirm they still hold
+        headers = self.get_headers(ws.title)
+        for attempt in range(2):
+            cols = [i for i, h in enumerate(headers, start=1) if self._norm(h) in wanted]
+            ranges = [gspread.utils.absolute_range_name(ws.title, "1:1")]
+            for col in cols:
+                letter = gspread.utils.rowcol_to_a1(1, col).rstrip("1")
+                ranges.append(gspread.utils.absolute_range_name(ws.title, f"{letter}2:{letter}"))
+            result = with_retry(self.get_spreadsheet().values_batch_get, ranges, params=UNFORMATTED_PARAMS)
+            value_ranges = result.get("valueRanges", [])
+            fresh_headers = (value_ranges[0].get("values") or [[]])[0] if value_ranges else []
+            # A second mismatch means columns are being edited right now; keep the positions just read
+            if fresh_headers == headers or attempt == 1:
+                break
+            # Columns moved since the header row was cached: drop it and read again at the new positions
+            SheetsManager.get_header_row.clear()
+            headers = fresh_headers
+
+        columns = {
+            # Row-major single-column ranges come back as [[v2], [v3], [], ...]
+            col: [cell[0] if cell else "" for cell in vr.get("values", [])]
+            for col, vr in zip(cols, value_ranges[1:])
+        }
+        return headers, columns
+
+    def invalidate_snapshot(self) -> None:
+        """Drops cached sheet reads after a write so the next read is fresh."""
+        st.session_state["sheet_snapshot"] = {}
+        st.cache_data.clear()
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def _get_row_index(self, ws: gspread.Worksheet) -> Dict[str, int]:
+        """Maps normalised Product_Name -> sheet row, built once per snapshot."""
+        header_map = self._get_header_map(ws)
+        _, columns = self.get_snapshot(ws)
+        snapshot = st.session_state["sheet_snapshot"][self._snapshot_key(ws)]
+        if "row_index" not in snapshot:
+            product_col = header_map.get(self._norm("Product_Name"))
+            row_index: Dict[str, int] = {}
+            for idx, name in enumerate(columns.get(product_col, []), start=2):
+                if name != "":
+                    # First occurrence wins, matching a top-down scan
+                    row_index.setdefault(self._norm(name), idx)
+            snapshot["row_index"] = row_index
+        return snapshot["row_index"]
+
     def _get_header_map(self, ws: gspread.Worksheet) -> Dict[str, int]:
-        headers = ws.row_values(1)
+        """Maps normalised header -> 1-based column, built once per snapshot."""
+        headers, _ = self.get_snapshot(ws)
         if not headers:
             raise RuntimeError("Header row (row 1) is empty.")
-        return {self._norm(h): i + 1 for i, h in enumerate(headers)}
+        snapshot = st.session_state["sheet_snapshot"][self._snapshot_key(ws)]
+        if "header_map" not in snapshot:
+            snapshot["header_map"] = {self._norm(h): i + 1 for i, h in enumerate(headers)}
+        return snapshot["header_map"]
+
+    def _ensure_price_format(self, ws: gspread.Worksheet) -> None:
+        """Applies the currency format to the price columns once per process, so prices stay numeric cells."""
+        key = (self.config.spreadsheet_id, ws.title)
+        if key in _price_formatted:
+            return
+        header_map = self._get_header_map(ws)
+        formats = []
+        for colname in STORE_PRICE_COLUMNS.values():
+            col = header_map.get(self._norm(colname))
+            if col:
+                letter = gspread.utils.rowcol_to_a1(1, col).rstrip("1")
+                formats.append({"range": f"{letter}2:{letter}", "format": PRICE_NUMBER_FORMAT})
+        if formats:
+            with_retry(ws.batch_format, formats)
+        _price_formatted.add(key)
 
     # --- PUBLIC METHODS (CRUD) ---
     
     def get_spreadsheet(self, name_or_id: Optional[str] = None) -> gspread.Spreadsheet:
-        """FIXED: Accepts arg to match app.py. Returns live connection."""
-        client = self._get_client()
-        return client.open_by_key(self.config.spreadsheet_id)
+        """FIXED: Accepts arg to match app.py. Returns the cached handle, opened by key."""
+        return _open_spreadsheet(self.config.spreadsheet_id)
+
+    def get_worksheet(self, title: str) -> gspread.Worksheet:
+        """Cached worksheet handle by title; raises WorksheetNotFound like Spreadsheet.worksheet."""
+        return _open_worksheet(self.config.spreadsheet_id, title)
+
+    def get_worksheet_at(self, index: int = 0) -> gspread.Worksheet:
+        """Cached worksheet handle by position, like Spreadsheet.get_worksheet."""
+        return _open_worksheet_at(self.config.spreadsheet_id, index)
+
+    @staticmethod
+    @st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+    def get_header_row(spreadsheet_id: str, worksheet_name: str) -> List[str]:
+        # Row 1 straight from the values API, so no worksheet metadata is fetched
+        result = with_retry(
+            _open_spreadsheet(spreadsheet_id).values_get,
+            gspread.utils.absolute_range_name(worksheet_name, "1:1"),
+        )
+        return (result.get("values") or [[]])[0]
+
+    def get_headers(self, worksheet_name: str) -> List[str]:
+        return SheetsManager.get_header_row(self.config.spreadsheet_id, worksheet_name)
 
     @staticmethod
-    @st.cache_data(ttl=600)
+    @st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
     def get_data(spreadsheet_id: str, worksheet_name: str = "Products_Master") -> pd.DataFrame:
-        sa_info: Dict[str, Any] = dict(st.secrets["gcp_service_account"])
-        creds = Credentials.from_service_account_info(sa_info, scopes=SCOPES)
-        client = gspread.authorize(creds)
-        ws = client.open_by_key(spreadsheet_id).worksheet(worksheet_name)
-        return pd.DataFrame(ws.get_all_records())
+        ws = _open_worksheet(spreadsheet_id, worksheet_name)
+        # One rectangular values fetch straight into a DataFrame, skipping get_all_records' per-row dicts
+        values = with_retry(
+            ws.get_values,
+            value_render_option=UNFORMATTED_PARAMS["valueRenderOption"],
+            date_time_render_option=UNFORMATTED_PARAMS["dateTimeRenderOption"],
+        )
+        if not values:
+            return pd.DataFrame()
+        df = pd.DataFrame(values[1:], columns=values[0])
+        for col in STORE_PRICE_COLUMNS.values():
+            if col in df.columns:
+                # Same parsing as the app's loaders, so legacy text prices like "$3.50" survive
+                df[col] = pd.to_numeric(df[col].map(parse_price), errors="coerce", downcast="float")
+        return df
 
     def get_products_master(self) -> pd.DataFrame:
         return SheetsManager.get_data(self.config.spreadsheet_id, self.config.worksheet_name)
 
-    def update_price(self, product_name: str, store_name: str, new_price: Any) -> None:
-        """Updates Price and Last_Updated timestamp."""
-        ws = self._get_worksheet()
+    @staticmethod
+    @st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+    def get_records(spreadsheet_id: str, worksheet_name: str = "Products_Master") -> List[Dict[str, Any]]:
+        """Rows as plain dicts, for callers that read field-by-field and don't need a DataFrame."""
+        ws = _open_worksheet(spreadsheet_id, worksheet_name)
+        # Unformatted values are already typed, so skip gspread's numericise pass
+        return with_retry(
+            ws.get_all_records,
+            value_render_option=UNFORMATTED_PARAMS["valueRenderOption"],
+            numericise_ignore=["all"],
+        )
+
+    def get_products_master_records(self) -> List[Dict[str, Any]]:
+        return SheetsManager.get_records(self.config.spreadsheet_id, self.config.worksheet_name)
+
+    def _price_update_ranges(
+        self, ws: gspread.Worksheet, product_name: str, store_name: str, new_price: Any,
+        row_index: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Builds the price + Last_Updated ranges for one product; empty if the product isn't in the sheet."""
         header_map = self._get_header_map(ws)
         
         product_col = header_map.get(self._norm("Product_Name"))
         last_updated_col = header_map.get(self._norm("Last_Updated"))
         
         store_key = self._norm(store_name)
-        store_to_colname = {"woolworths": "Woolworths_Price", "coles": "Coles_Price", "aldi": "Aldi_Price"}
-        price_col = header_map.get(self._norm(store_to_colname.get(store_key, "")))
+        price_col = header_map.get(self._norm(STORE_PRICE_COLUMNS.get(store_key, "")))
 
         if not all([product_col, last_updated_col, price_col]):
             raise ValueError("Required columns missing in sheet.")
 
-        col_values = ws.col_values(product_col)
-        target_row = next((idx for idx, val in enumerate(col_values[1:], start=2) if self._norm(val) == self._norm(product_name)), None)
+        # Dict lookup against the snapshot's row index; no extra Sheets request needed
+        if row_index is None:
+            row_index = self._get_row_index(ws)
+        target_row = row_index.get(self._norm(product_name))
+        if not target_row:
+            return []
+
+        if new_price is None or (isinstance(new_price, str) and not new_price.strip()):
+            # An empty price clears the cell, as it did when the raw value went through USER_ENTERED
+            cell: Any = ""
+        else:
+            price = parse_price(new_price)
+            if price is None:
+                raise ValueError(f"Unrecognised price {new_price!r} for '{product_name}' at '{store_name}'.")
+            # The price goes in as a plain number so the sheet can aggregate it
+            cell = round(price, 2)
+
+        return [
+            {"range": gspread.utils.rowcol_to_a1(target_row, price_col), "values": [[cell]]},
+            {"range": gspread.utils.rowcol_to_a1(target_row, last_updated_col), "values": [[self._now_iso_utc()]]},
+        ]
+
+    def _write_ranges(self, ws: gspread.Worksheet, data: List[Dict[str, Any]]) -> None:
+        self._ensure_price_format(ws)
+        with_retry(ws.batch_update, data, value_input_option="USER_ENTERED")
+        self.invalidate_snapshot()
+
+    def get_row_index(self) -> Dict[str, int]:
+        """Product row index for callers that update many products; pass it back via row_index=."""
+        return self._get_row_index(self._get_worksheet())
+
+    def update_price(self, product_name: str, store_name: str, new_price: Any, row_index: Optional[Dict[str, int]] = None) -> None:
+        """Updates Price and Last_Updated timestamp."""
+        ws = self._get_worksheet()
+        data = self._price_update_ranges(ws, product_name, store_name, new_price, row_index)
+        if data:
+            # Price and timestamp ship together in one values.batchUpdate request
+            self._write_ranges(ws, data)
+
+    def _is_unchanged(self, ws: gspread.Worksheet, price_range: Dict[str, Any]) -> bool:
+        """True when the snapshot already holds this price, so rewriting it would change nothing."""
+        row, col = gspread.utils.a1_to_rowcol(price_range["range"])
+        _, columns = self.get_snapshot(ws)
+        cells = columns.get(col, [])
+        current = cells[row - 2] if row - 2 < len(cells) else ""
+        try:
+            return round(float(current), 2) == price_range["values"][0][0]
+        except (TypeError, ValueError):
+            return False
+
+    def batch_update_prices(self, updates: List[Tuple[str, str, Any]], skip_unchanged: bool = True) -> int:
+        """Writes many (product_name, store_name, price) updates in one batch_update. Returns how many were written.
+
+        Raises ValueError, before anything is sent, if any price can't be read as a single number.
+        """
+        ws = self._get_worksheet()
+        row_index = self._get_row_index(ws)
+        data: List[Dict[str, Any]] = []
+        written = 0
+        for product_name, store_name, new_price in updates:
+            ranges = self._price_update_ranges(ws, product_name, store_name, new_price, row_index)
+            # Most prices are stable between runs; only ship the ones that actually moved
+            if not ranges or (skip_unchanged and self._is_unchanged(ws, ranges[0])):
+                continue
+            data.extend(ranges)
+            written += 1
+        if data:
+            self._write_ranges(ws, data)
+        return written
+
+    def queue_price_update(self, product_name: str, store_name: str, new_price: Any) -> None:
+        """Queues a price update for this session; the queue is flushed in one request once it is full or stale."""
+        ws = self._get_worksheet()
+        data = self._price_update_ranges(ws, product_name, store_name, new_price)
+        if not data:
+            return
+        pending = st.session_state.setdefault("_pending_updates", [])
+        pending.append(data)
+        last_flush = st.session_state.setdefault("_last_flush", time.monotonic())
+        if len(pending) >= FLUSH_MAX_UPDATES or time.monotonic() - last_flush > FLUSH_MAX_AGE_SECONDS:
+            self.flush_price_updates()
+
+    @staticmethod
+    def pending_update_count() -> int:
+        return len(st.session_state.get("_pending_updates", []))
+
+    def flush_price_updates(self) -> int:
+        """Writes every queued price update in a single batch_update. Returns the number of updates sent."""
+        pending = st.session_state.get("_pending_updates", [])
+        st.session_state["_last_flush"] = time.monotonic()
+        if not pending:
+            return 0
+        self._write_ranges(self._get_worksheet(), [r for data in pending for r in data])
+        st.session_state["_pending_updates"] = []
+        return len(pending)
 
-        if target_row:
-            ws.update(
-                [gspread.utils.rowcol_to_a1(target_row, price_col), gspread.utils.rowcol_to_a1(target_row, last_updated_col)],
-                [[new_price], [self._now_iso_utc()]],
-                value_input_option="USER_ENTERED"
-            )
+    def add_worksheet_with_headers(self, title: str, headers: List[str], rows: int = 100) -> None:
+        """Creates a worksheet and writes its header row in a single batchUpdate request."""
+        # Choosing the sheetId ourselves lets the header write target the sheet in the same request
+        sheet_id = zlib.crc32(title.encode()) & 0x7FFFFFFF
+        body = {
+            "requests": [
+                {"addSheet": {"properties": {
+                    "sheetId": sheet_id,
+                    "title": title,
+                    "gridProperties": {"rowCount": rows, "columnCount": len(headers)},
+                }}},
+                {"updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": h}} for h in headers]}],
+                    "fields": "userEnteredValue",
+                }},
+            ]
+        }
+        # Not idempotent: a retried addSheet that had already landed fails with "already exists"
+        with_retry(self.get_spreadsheet().batch_update, body, retry_on=RATE_LIMIT_STATUS)
 
     def add_product(self, product_name: str, category: str = "", size: str = "") -> None:
         """Appends a new product row."""
         ws = self._get_worksheet()
         header_map = self._get_header_map(ws)
-        headers = ws.row_values(1)
+        headers, _ = self.get_snapshot(ws)
         row = [""] * len(headers)
 
         for col_name, val in [("Product_Name", product_name), ("Category", category), ("Size", size), ("Last_Updated", self._now_iso_utc())]:
             col_idx = header_map.get(self._norm(col_name))
             if col_idx: row[col_idx - 1] = val
         
-        ws.append_row(row, value_input_option="USER_ENTERED")
+        # Not idempotent: retrying an append that had already landed would duplicate the row
+        with_retry(ws.append_row, row, value_input_option="USER_ENTERED", retry_on=RATE_LIMIT_STATUS)
+        self.invalidate_snapshot()
 
 # --- TEST BLOCK ---
 if __name__ == "__main__":